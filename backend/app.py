@@ -1,13 +1,19 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request
 from flask_cors import CORS
+import gzip
 import os
-import json
-from datetime import datetime
+import orjson
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
 import re
 from xai_sdk import Client
 from xai_sdk.chat import system, user
-from pydantic import BaseModel, Field
-from typing import List
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, ValidationError
+from typing import List, NamedTuple
 from youtube_transcript_api import YouTubeTranscriptApi
 from youtube_transcript_api._errors import TranscriptsDisabled, NoTranscriptFound
 from dotenv import load_dotenv
@@ -18,17 +24,191 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+
+def ojson(payload, status=200):
+    """Build a JSON response with orjson (faster than Flask's jsonify)."""
+    return app.response_class(orjson.dumps(payload), status=status, mimetype='application/json')
+
+
 # Configuration
-FACTS_DIR = os.path.join(os.path.dirname(__file__), '..', 'facts')
+FACTS_DIR = (Path(__file__).parent.parent / 'facts').resolve()
 GROK_API_KEY = os.environ.get('GROK_API_KEY', '') or os.environ.get('XAI_API_KEY', '')
 GROK_MODEL = os.environ.get('GROK_MODEL', 'grok-4-1-fast-non-reasoning')
 
 # Ensure facts directory exists
-os.makedirs(FACTS_DIR, exist_ok=True)
+FACTS_DIR.mkdir(exist_ok=True)
+
+# Precompiled title-classification patterns (compiled once at import instead of
+# on every request)
+
+# Music video indicators
+MUSIC_PATTERNS = [
+    r'\(Official\s*(?:Video|Music\s*Video|Audio|MV)\)',
+    r'\[Official\s*(?:Video|Music\s*Video|Audio|MV)\]',
+    r'\(Lyric\s*Video\)',
+    r'\[Lyric\s*Video\]',
+    r' - (?:Official|Lyric|Music)\s*(?:Video|Audio)',
+    r'(?:Official|Lyric)\s*Video',
+    r'\bMV\b',
+    r'\bOfficial\s*Audio\b'
+]
+
+# Non-music video indicators (skip these)
+NON_MUSIC_PATTERNS = [
+    r'\b(?:Tutorial|How\s*to|Guide|Review|Unboxing|Vlog|Interview|Podcast|Gameplay|Walkthrough)\b',
+    r'\b(?:Trailer|Teaser|Behind\s*the\s*Scenes|BTS|Making\s*of)\b',
+    r'\b(?:Ep\s*\d+|Episode\s*\d+|Season\s*\d+|S\d+E\d+)\b',  # TV shows
+    r'\b(?:Part\s*\d+|#\d+)\b',  # Multi-part videos
+    r'\b(?:Live\s*Stream|Streaming)\b',
+    r'\b(?:News|Documentary|Lecture|Sermon)\b'
+]
+
+# Fuse each list into one alternation so a title is classified with a single
+# scan instead of one pass per pattern. Named groups map the match back to the
+# original pattern for the reason string.
+MUSIC_COMBINED = re.compile('|'.join(f'(?P<g{i}>{p})' for i, p in enumerate(MUSIC_PATTERNS)), re.IGNORECASE)
+NON_MUSIC_COMBINED = re.compile('|'.join(f'(?P<g{i}>{p})' for i, p in enumerate(NON_MUSIC_PATTERNS)), re.IGNORECASE)
+
+# Common music-related words that are plain substrings - checked with `in` on
+# the casefolded title, which is much cheaper than the regex engine
+MUSIC_LITERALS = ('feat.', 'ft.', 'featuring', 'remix', 'cover', 'acoustic', 'official audio')
+
+# Music words that genuinely need word boundaries stay as regex
+MUSIC_WORDS_RE = re.compile(r'\b(live|performance)\b', re.IGNORECASE)
+
+# Every substring (plus any digit, for the Ep/Season/Part/#N patterns) that
+# can trigger one of the indicator checks above. If none appear in the
+# casefolded title, classification can return the permissive default without
+# touching the regex engine at all.
+FAST_TRIGGER_SUBS = (
+    ' - ', 'official', 'lyric', 'music', 'mv',
+    'feat', 'ft.', 'remix', 'cover', 'acoustic', 'live', 'performance',
+    'tutorial', 'how', 'guide', 'review', 'unboxing', 'vlog', 'interview',
+    'podcast', 'gameplay', 'walkthrough', 'trailer', 'teaser', 'behind',
+    'bts', 'making', 'stream', 'news', 'documentary', 'lecture', 'sermon'
+)
+
+# YouTube video IDs are 11 chars of [A-Za-z0-9_-]; accept a small range
+# around that so junk (and path traversal attempts) is rejected before any
+# filesystem or Grok work
+VIDEO_ID_RE = re.compile(r'^[A-Za-z0-9_-]{6,20}$')
+
+# Bound on title length - caps the regex work in is_likely_music_video
+MAX_TITLE_LENGTH = 300
+
+# Common YouTube title suffixes stripped before artist/song parsing
+SUFFIX_PAREN_RE = re.compile(r'\s*\((Official|Lyric|Music)?\s*(Video|Audio|MV|HD|4K)\)', re.IGNORECASE)
+SUFFIX_BRACK_RE = re.compile(r'\s*\[(Official|Lyric|Music)?\s*(Video|Audio|MV|HD|4K)\]', re.IGNORECASE)
+
+# Artist/song delimiters - one match call captures both halves at the first
+# delimiter, replacing the split-then-strip passes
+ARTIST_SONG_DASH_RE = re.compile(r'^(.*?) - (.*)$')
+ARTIST_SONG_PIPE_RE = re.compile(r'^(.*?)\|(.*)$')
+
+# Prompts are split into a byte-stable instruction block and a small dynamic
+# block sent as separate user messages. Keeping the instruction bytes
+# identical across requests lets the provider's prompt-prefix cache reuse
+# them (system + instructions first, per-video data last).
+GENERAL_STATIC_INSTRUCTIONS = """Generate interesting Pop Up Video style facts for a YouTube video. The video details follow in the next message.
+
+Analyze the title, description, and transcript to identify:
+- Main subjects (people, products, places, events)
+- Key topics or themes discussed
+- Any recognizable entities
+- What's being talked about at different timestamps
+- If a transcript or lyrics are not provided, retrieve them from another source and analyze accordingly.
+
+Generate fun, surprising trivia facts about:
+- People mentioned or featured (actors, creators, personalities)
+- Products or brands mentioned
+- Historical context or events referenced
+- Behind-the-scenes information
+- Cultural impact or significance
+- Production details if applicable
+- Any interesting connections or trivia
+- Content discussed at specific timestamps
+
+Facts should be:
+- Short (1-2 sentences max, under 200 characters)
+- Entertaining and surprising
+- Factually accurate (DO NOT make up information)
+- In the style of VH1's Pop Up Video
+- Relevant to what's mentioned in the title/description
+
+Return ONLY valid JSON matching this structure:
+{
+  "facts": [
+    {"time": 10, "text": "First fact..."},
+    {"time": 25, "text": "Second fact..."},
+    ...
+  ]
+}"""
+
+GENERAL_TIMING_TEMPLATE = "Distribute timing evenly from 10 seconds to {end_time} seconds. Generate approximately {num_facts} facts."
+GENERAL_TIMING_DEFAULT = "Distribute timing evenly from 10 seconds to 280 seconds. Generate 10-20 facts."
+
+GENERAL_DYNAMIC_TEMPLATE = """Title: "{title}"
+YouTube Video ID: {video_id}
+Video Duration: {duration} seconds{description_context}{transcript_context}
+
+{timing_instruction}"""
+
+MUSIC_STATIC_INSTRUCTIONS = """Generate interesting Pop Up Video style facts for a music video. The video details follow in the next message.
+
+Generate fun, surprising trivia facts about:
+- The song's creation and recording
+- The artist/band members
+- The music video production
+- The song's chart performance and cultural impact
+- The era when this was released
+- Any interesting backstory or context
+- Specific lyrics and their meanings (if transcript provided)
+- Don't just quote lyrics and say it's a double entendre; make it an interesting fact, and you can use wordplay yourself.
+- For the Lyric references, provide a second layer of meaning or interpretation.
+- No Emojis.
+
+IMPORTANT: If lyrics/transcript is provided:
+- Match facts to relevant timestamps where specific lyrics are sung. THis does not have to be on a 15 second boundary or anything.
+- Don't put the timestamp in the facts themselves, but ensure the timing corresponds to when the lyric is sung.
+- You also don't have to quote the lyrics in the fact, just allude to them. This saves space and allows more room for facts.
+- Reference actual lyrics when discussing song meaning or wordplay
+- Use real references from sites like genius.com, songfacts.com, or similar to provide accurate lyric interpretations
+- Time facts to appear during meaningful or interesting lyrical moments
+- Feel free to include facts about other people mentioned in the lyrics at the appropriate time stamps where they're mentioned in the transcript. 
+- Call out double entendres, puns, or clever wordplay in the lyrics, but not for every fact.
+
+Facts should be:
+- Short (1-2 sentences max, under 200 characters)
+- Entertaining and surprising
+- Factually accurate (DO NOT make up information). cite your sources.
+- In the style of VH1's Pop Up Video
+- Relevant to the song, artist, and lyrics, but also feel free to call out layers or other interesting trivia.
+- Any facts that are boring or dry should be avoided, or modified to be more entertaining.
+- "Punched Up" a notch or two for maximum entertainment value.
+
+Return ONLY valid JSON matching this structure:
+{
+  "facts": [
+    {"time": 10, "text": "First fact..."},
+    {"time": 25, "text": "Second fact..."},
+    ...
+  ]
+}"""
+
+MUSIC_TIMING_TEMPLATE = "Distribute timing evenly from 10 seconds to {end_time} seconds (approximately one fact every 10-15 seconds). Generate approximately {num_facts} facts."
+MUSIC_TIMING_DEFAULT = "Distribute timing evenly from 10 seconds to 280 seconds. Generate 15-20 facts."
+
+MUSIC_DYNAMIC_TEMPLATE = """"{title}" by {artist}
+YouTube Video ID: {video_id}
+Video Duration: {duration} seconds{description_context}{transcript_context}
+
+{timing_instruction}"""
 
 # Pydantic models for structured output
 class Fact(BaseModel):
     """A single Pop Up Video fact with timing"""
+    model_config = ConfigDict(validate_assignment=False, str_strip_whitespace=True)
+
     time: int = Field(ge=0, le=600, description="Time in seconds when the fact should appear (0-600)")
     text: str = Field(min_length=10, max_length=250, description="The fact text (10-250 characters)")
 
@@ -36,8 +216,22 @@ class FactsList(BaseModel):
     """Collection of Pop Up Video facts"""
     facts: List[Fact] = Field(min_length=1, max_length=50, description="List of 1-50 facts")
 
+# Build the core schemas once at import so the first request doesn't pay
+# validator construction
+Fact.model_rebuild()
+FactsList.model_rebuild()
+
+# Adapter built once at import so per-fact validation on the streaming path
+# doesn't pay per-call adapter construction
+FACT_ADAPTER = TypeAdapter(Fact)
+
+
+# System message reused across every chat - built once instead of per call
+SYSTEM_MESSAGE = system("You are a Pop Up Video fact generator. Generate interesting, accurate trivia facts.")
 
-# Initialize xAI SDK client
+# Initialize xAI SDK client once at import; the SDK keeps a single
+# persistent channel on the client, so all requests reuse one connection
+# instead of paying a TLS handshake per call
 xai_client = None
 try:
     if GROK_API_KEY:
@@ -68,12 +262,12 @@ def fetch_youtube_transcript(video_id):
         try:
             transcript = transcript_list.find_manually_created_transcript(['en'])
             print(f"✅ Found manually created English transcript")
-        except:
+        except NoTranscriptFound:
             # Fall back to auto-generated English
             try:
                 transcript = transcript_list.find_generated_transcript(['en'])
                 print(f"✅ Found auto-generated English transcript")
-            except:
+            except NoTranscriptFound:
                 # Try any English transcript
                 transcript = transcript_list.find_transcript(['en'])
                 print(f"✅ Found English transcript")
@@ -81,17 +275,16 @@ def fetch_youtube_transcript(video_id):
         # Fetch the actual transcript data
         fetched_transcript = transcript.fetch()
         
-        # Convert to raw data (list of dicts)
-        raw_data = fetched_transcript.to_raw_data()
-        
-        # Format the transcript
-        formatted_transcript = []
-        for entry in raw_data:
-            formatted_transcript.append({
-                'start': int(entry['start']),  # Round to integer seconds
-                'duration': entry['duration'],
-                'text': entry['text']
-            })
+        # Format the transcript straight off the snippet objects - no need
+        # for the intermediate to_raw_data() list of dicts
+        formatted_transcript = [
+            {
+                'start': int(snippet.start),  # Round to integer seconds
+                'duration': snippet.duration,
+                'text': snippet.text
+            }
+            for snippet in fetched_transcript
+        ]
         
         print(f"✅ Transcript fetched: {len(formatted_transcript)} entries")
         return formatted_transcript
@@ -107,42 +300,155 @@ def fetch_youtube_transcript(video_id):
         return None
 
 
+# Shared pool for work that can overlap the request thread, e.g. fetching
+# the YouTube transcript while the title is being classified
+_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix='popup')
+
+# Manifest of cached video_ids kept in memory so /list-facts doesn't have
+# to scan the directory per request; seeded from disk once at import and
+# updated on every successful facts write
+_manifest_lock = threading.Lock()
+with os.scandir(FACTS_DIR) as _it:
+    _MANIFEST = {e.name[:-5] for e in _it if e.is_file(follow_symlinks=False) and e.name.endswith('.json') and not e.name.startswith('_')}
+
+# Per-video locks so concurrent cache misses for the same video_id collapse
+# into a single Grok call; late arrivals are served from the cache re-check
+_INFLIGHT_LOCKS = {}
+_inflight_guard = threading.Lock()
+
+
+def _video_lock(video_id):
+    with _inflight_guard:
+        lock = _INFLIGHT_LOCKS.get(video_id)
+        if lock is None:
+            lock = _INFLIGHT_LOCKS[video_id] = threading.Lock()
+        return lock
+
+
+def _release_video_lock(video_id, lock):
+    lock.release()
+    with _inflight_guard:
+        if not lock.locked():
+            _INFLIGHT_LOCKS.pop(video_id, None)
+
+
+def _write_facts_file(facts_file, facts_data):
+    """
+    Write a facts file atomically: serialize to a temp file in the same
+    directory and rename it into place, so a concurrent reader can never
+    observe a partially written JSON.
+    """
+    tmp = facts_file.with_suffix('.json.tmp.' + os.urandom(4).hex())
+    tmp.write_bytes(orjson.dumps(facts_data, option=orjson.OPT_INDENT_2))
+    os.replace(tmp, facts_file)
+    if not facts_file.name.startswith('_'):
+        with _manifest_lock:
+            _MANIFEST.add(facts_file.name[:-5])
+
+
+@lru_cache(maxsize=512)
+def _read_facts(video_id, mtime_ns):
+    """
+    Read a facts file into memory, cached per (video_id, mtime).
+    The mtime in the key makes invalidation automatic when a file is
+    rewritten.
+    """
+    return (FACTS_DIR / f'{video_id}.json').read_bytes()
+
+
+@lru_cache(maxsize=512)
+def _read_facts_gzipped(video_id, mtime_ns):
+    """Pre-compressed cache-hit envelope for gzip-capable clients."""
+    body = _read_facts(video_id, mtime_ns)
+    return gzip.compress(b'{"source":"cache","data":' + body + b'}', compresslevel=6)
+
+
+def _cached_facts_response(video_id, mtime_ns):
+    """
+    Build the cache-hit response. Clients that accept gzip get the
+    envelope compressed once and cached, so repeat hits ship a fraction of
+    the bytes with zero per-request compression work.
+    """
+    if 'gzip' in (request.headers.get('Accept-Encoding') or ''):
+        resp = app.response_class(_read_facts_gzipped(video_id, mtime_ns), mimetype='application/json')
+        resp.headers['Content-Encoding'] = 'gzip'
+        resp.headers['Vary'] = 'Accept-Encoding'
+        return resp
+    return app.response_class(
+        b'{"source":"cache","data":' + _read_facts(video_id, mtime_ns) + b'}',
+        mimetype='application/json'
+    )
+
+
+# Canonical cache: re-uploads and mirrors of the same song get different
+# video_ids but identical facts. Key facts by normalized artist/song plus a
+# 30s duration bucket so a second upload reuses the first one's facts
+# instead of paying another Grok call.
+CANONICAL_INDEX_FILE = FACTS_DIR / '_canonical_index.json'
+
+# The index lives in memory for the life of the process - loaded once at
+# import, written through to disk on updates - so lookups don't reread and
+# reparse the file per request
+_canonical_lock = threading.Lock()
+try:
+    _CANONICAL_INDEX = orjson.loads(CANONICAL_INDEX_FILE.read_bytes())
+except (FileNotFoundError, orjson.JSONDecodeError):
+    _CANONICAL_INDEX = {}
+
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _canonical_key(artist, song, duration):
+    norm_artist = WHITESPACE_RE.sub(' ', artist.casefold()).strip()
+    norm_song = WHITESPACE_RE.sub(' ', song.casefold()).strip()
+    bucket = int(duration // 30) if duration else -1
+    return f'{norm_artist}|{norm_song}|{bucket}'
+
+
+def _canonical_lookup(key):
+    """Return the cached facts_data for a canonical key, or None."""
+    with _canonical_lock:
+        source_id = _CANONICAL_INDEX.get(key)
+    if not source_id:
+        return None
+    try:
+        return orjson.loads((FACTS_DIR / f'{source_id}.json').read_bytes())
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        return None
+
+
+def _canonical_register(key, video_id):
+    with _canonical_lock:
+        _CANONICAL_INDEX[key] = video_id
+        snapshot = dict(_CANONICAL_INDEX)
+    _write_facts_file(CANONICAL_INDEX_FILE, snapshot)
+
+
+@lru_cache(maxsize=4096)
 def is_likely_music_video(title):
     """
     Check if the video title looks like a music video.
     Returns (is_music_video, reason)
     """
-    # Music video indicators
-    music_indicators = [
-        r'\(Official\s*(Video|Music\s*Video|Audio|MV)\)',
-        r'\[Official\s*(Video|Music\s*Video|Audio|MV)\]',
-        r'\(Lyric\s*Video\)',
-        r'\[Lyric\s*Video\]',
-        r' - (Official|Lyric|Music)\s*(Video|Audio)',
-        r'(Official|Lyric)\s*Video',
-        r'\bMV\b',
-        r'\bOfficial\s*Audio\b'
-    ]
-    
-    # Non-music video indicators (skip these)
-    non_music_indicators = [
-        r'\b(Tutorial|How\s*to|Guide|Review|Unboxing|Vlog|Interview|Podcast|Gameplay|Walkthrough)\b',
-        r'\b(Trailer|Teaser|Behind\s*the\s*Scenes|BTS|Making\s*of)\b',
-        r'\b(Ep\s*\d+|Episode\s*\d+|Season\s*\d+|S\d+E\d+)\b',  # TV shows
-        r'\b(Part\s*\d+|#\d+)\b',  # Multi-part videos
-        r'\b(Live\s*Stream|Streaming)\b',
-        r'\b(News|Documentary|Lecture|Sermon)\b'
-    ]
-    
+    # Too short to carry any indicator - fall back to the permissive default
+    # without running any regex
+    if len(title) < 6:
+        return True, "Title too short to classify"
+
+    # Fast path: if no trigger substring (or digit) is present, none of the
+    # indicator checks below can match, so skip straight to the default
+    low = title.casefold()
+    if not any(sub in low for sub in FAST_TRIGGER_SUBS) and not any(c.isdigit() for c in title):
+        return True, "No clear non-music indicators"
+
     # Check for non-music indicators first (highest priority)
-    for pattern in non_music_indicators:
-        if re.search(pattern, title, re.IGNORECASE):
-            return False, f"Contains non-music keyword: {pattern}"
-    
+    m = NON_MUSIC_COMBINED.search(title)
+    if m:
+        return False, f"Contains non-music keyword: {NON_MUSIC_PATTERNS[int(m.lastgroup[1:])]}"
+
     # Check for strong music indicators
-    for pattern in music_indicators:
-        if re.search(pattern, title, re.IGNORECASE):
-            return True, "Contains music video keywords"
+    if MUSIC_COMBINED.search(title):
+        return True, "Contains music video keywords"
     
     # Check for artist - song format (common for music videos)
     if ' - ' in title:
@@ -151,15 +457,25 @@ def is_likely_music_video(title):
         if len(parts) == 2 and 2 <= len(parts[0]) <= 50 and 2 <= len(parts[1]) <= 100:
             return True, "Has artist - song format"
     
-    # Check for common music-related words
-    music_words = r'\b(feat\.|ft\.|featuring|remix|cover|acoustic|live|performance)\b'
-    if re.search(music_words, title, re.IGNORECASE):
+    # Check for common music-related words (literal tokens first, then the
+    # boundary-sensitive ones)
+    if any(tok in low for tok in MUSIC_LITERALS):
+        return True, "Contains music-related terms"
+    if MUSIC_WORDS_RE.search(title):
         return True, "Contains music-related terms"
     
     # Default: assume it might be music (be permissive)
     return True, "No clear non-music indicators"
 
 
+class ParsedTitle(NamedTuple):
+    artist: str
+    song: str
+    full_title: str
+    is_music: bool
+
+
+@lru_cache(maxsize=4096)
 def parse_video_title(title):
     """
     Extract artist and song from YouTube video title.
@@ -169,202 +485,165 @@ def parse_video_title(title):
     - "Artist - Song (Official Video)"
     """
     # Remove common YouTube suffixes
-    clean_title = re.sub(r'\s*\((Official|Lyric|Music)?\s*(Video|Audio|MV|HD|4K)\)', '', title, flags=re.IGNORECASE)
-    clean_title = re.sub(r'\s*\[(Official|Lyric|Music)?\s*(Video|Audio|MV|HD|4K)\]', '', clean_title, flags=re.IGNORECASE)
+    clean_title = SUFFIX_PAREN_RE.sub('', title)
+    clean_title = SUFFIX_BRACK_RE.sub('', clean_title)
     clean_title = clean_title.strip()
     
-    # Try to split on common delimiters
-    if ' - ' in clean_title:
-        parts = clean_title.split(' - ', 1)
-        return {
-            'artist': parts[0].strip(),
-            'song': parts[1].strip(),
-            'full_title': clean_title,
-            'is_music': True
-        }
-    elif '|' in clean_title:
-        parts = clean_title.split('|', 1)
-        return {
-            'artist': parts[0].strip(),
-            'song': parts[1].strip(),
-            'full_title': clean_title,
-            'is_music': True
-        }
+    # Try to split on common delimiters (' - ' takes priority over '|')
+    m = ARTIST_SONG_DASH_RE.match(clean_title) or ARTIST_SONG_PIPE_RE.match(clean_title)
+    if m:
+        return ParsedTitle(
+            artist=m.group(1).strip(),
+            song=m.group(2).strip(),
+            full_title=clean_title,
+            is_music=True
+        )
     
     # Fallback - couldn't parse artist/song clearly
-    return {
-        'artist': 'Unknown',
-        'song': clean_title,
-        'full_title': clean_title,
-        'is_music': False  # Unclear format
-    }
+    return ParsedTitle(
+        artist='Unknown',
+        song=clean_title,
+        full_title=clean_title,
+        is_music=False  # Unclear format
+    )
 
 
-def generate_general_facts_with_grok(title, video_id, duration=None, description=None, transcript=None):
+def _build_general_prompt(title, video_id, duration=None, description=None, transcript=None):
     """
-    Generate Pop Up Video style facts for any video type (non-music).
+    Build the Grok prompt for general (non-music) videos.
     """
-    if not xai_client:
-        return [
-            {"time": 10, "text": f"Watching: {title}"},
-            {"time": 30, "text": "Pop Up Video facts coming soon!"},
-            {"time": 60, "text": "Set your GROK_API_KEY environment variable to generate real facts."}
-        ]
-    
     # Calculate fact timing based on video duration
     if duration and duration > 0:
         end_time = int(duration) - 10
         num_facts = max(10, min(25, int(duration / 15)))
-        timing_instruction = f"Distribute timing evenly from 10 seconds to {end_time} seconds. Generate approximately {num_facts} facts."
+        timing_instruction = GENERAL_TIMING_TEMPLATE.format_map({'end_time': end_time, 'num_facts': num_facts})
     else:
-        timing_instruction = "Distribute timing evenly from 10 seconds to 280 seconds. Generate 10-20 facts."
+        timing_instruction = GENERAL_TIMING_DEFAULT
     
     description_context = f"\nVideo Description: {description[:500]}..." if description and len(description) > 20 else ""
     
     # Format transcript for prompt (if available)
     transcript_context = ""
     if transcript and len(transcript) > 0:
-        # Summarize transcript to keep prompt size manageable
-        transcript_lines = []
-        for i, entry in enumerate(transcript):
-            if i % 3 == 0 or i < 10 or i > len(transcript) - 10:  # Sample: first 10, last 10, and every 3rd
-                transcript_lines.append(f"[{entry['start']}s] {entry['text']}")
-            if len(transcript_lines) >= 50:  # Limit to 50 entries
-                break
-        transcript_context = f"\n\nTranscript/Captions (sampled):\n" + "\n".join(transcript_lines[:50])
+        # Sample: first 10, last 10, and every 3rd in between (slices instead
+        # of a branch per entry), capped at 50 lines
+        if len(transcript) < 20:
+            sampled = transcript
+        else:
+            sampled = transcript[:10] + transcript[12:-9:3] + transcript[-9:]
+        transcript_context = "\n\nTranscript/Captions (sampled):\n" + "\n".join(
+            "[%ds] %s" % (entry['start'], entry['text']) for entry in sampled[:50])
     
-    prompt = f"""Generate interesting Pop Up Video style facts for this YouTube video:
-
-Title: "{title}"
-YouTube Video ID: {video_id}
-Video Duration: {int(duration) if duration else 'unknown'} seconds{description_context}{transcript_context}
-
-Analyze the title, description, and transcript to identify:
-- Main subjects (people, products, places, events)
-- Key topics or themes discussed
-- Any recognizable entities
-- What's being talked about at different timestamps
-- If a transcript or lyrics are not provided, retrieve them from another source and analyze accordingly.
-
-Generate fun, surprising trivia facts about:
-- People mentioned or featured (actors, creators, personalities)
-- Products or brands mentioned
-- Historical context or events referenced
-- Behind-the-scenes information
-- Cultural impact or significance
-- Production details if applicable
-- Any interesting connections or trivia
-- Content discussed at specific timestamps
-
-Facts should be:
-- Short (1-2 sentences max, under 200 characters)
-- Entertaining and surprising
-- Factually accurate (DO NOT make up information)
-- In the style of VH1's Pop Up Video
-- Relevant to what's mentioned in the title/description
-
-{timing_instruction}
-
-Return ONLY valid JSON matching this structure:
-{{
-  "facts": [
-    {{"time": 10, "text": "First fact..."}},
-    {{"time": 25, "text": "Second fact..."}},
-    ...
-  ]
-}}"""
+    dynamic = GENERAL_DYNAMIC_TEMPLATE.format_map({
+        'title': title,
+        'video_id': video_id,
+        'duration': int(duration) if duration else 'unknown',
+        'description_context': description_context,
+        'transcript_context': transcript_context,
+        'timing_instruction': timing_instruction
+    })
     
-    facts = _call_grok_with_retry(prompt)
-    return {'facts': facts, 'prompt': prompt}
+    return GENERAL_STATIC_INSTRUCTIONS, dynamic
 
 
-def generate_facts_with_grok(artist, song, title, video_id, duration=None, description=None, transcript=None):
+def generate_general_facts_with_grok(title, video_id, duration=None, description=None, transcript=None):
     """
-    Call Grok API using xAI SDK with Pydantic validation for music videos.
+    Generate Pop Up Video style facts for any video type (non-music).
     """
     if not xai_client:
-        # Fallback for testing without API key
         return [
-            {"time": 10, "text": f"This is {artist} - {song}!"},
+            {"time": 10, "text": f"Watching: {title}"},
             {"time": 30, "text": "Pop Up Video facts coming soon!"},
             {"time": 60, "text": "Set your GROK_API_KEY environment variable to generate real facts."}
         ]
     
+    instructions, details = _build_general_prompt(title, video_id, duration, description, transcript)
+    facts = _call_grok_with_retry(instructions, details)
+    return {'facts': facts, 'prompt': instructions + '\n\n' + details}
+
+
+def _compress_transcript(entries, window=8):
+    """
+    Merge transcript entries into one line per window-second bucket, dropping
+    filler tags and repeated adjacent lines (choruses). Cuts the transcript
+    tokens sent to Grok several-fold; the bucket size matches the granularity
+    facts are timed at anyway.
+    """
+    buckets = {}
+    for entry in entries:
+        text = entry['text'].strip()
+        if not text or text in ('[Music]', '[Applause]') or set(text) <= {'\u266a', ' '}:
+            continue
+        buckets.setdefault(entry['start'] // window, []).append(text)
+
+    compressed = []
+    prev_text = None
+    for bucket in sorted(buckets):
+        text = ' '.join(buckets[bucket])
+        if text == prev_text:
+            continue
+        compressed.append({'start': bucket * window, 'text': text})
+        prev_text = text
+    return compressed
+
+
+def _build_music_prompt(artist, song, title, video_id, duration=None, description=None, transcript=None):
+    """
+    Build the Grok prompt for music videos.
+    """
     # Calculate fact timing based on video duration
     if duration and duration > 0:
         end_time = int(duration) - 10  # Stop 10 seconds before end
         num_facts = max(15, min(25, int(duration / 15)))  # 1 fact every ~15 seconds
-        timing_instruction = f"Distribute timing evenly from 10 seconds to {end_time} seconds (approximately one fact every 10-15 seconds). Generate approximately {num_facts} facts."
+        timing_instruction = MUSIC_TIMING_TEMPLATE.format_map({'end_time': end_time, 'num_facts': num_facts})
     else:
-        timing_instruction = "Distribute timing evenly from 10 seconds to 280 seconds. Generate 15-20 facts."
+        timing_instruction = MUSIC_TIMING_DEFAULT
     
     description_context = f"\nVideo Description: {description[:500]}..." if description and len(description) > 20 else ""
     
-    # Format transcript/lyrics for prompt (if available)
+    # Format transcript/lyrics for prompt (if available), compressed to one
+    # line per time bucket to keep the prompt small
     transcript_context = ""
     if transcript and len(transcript) > 0:
-        # For music videos, include full lyrics with timestamps
-        lyrics_lines = []
-        for entry in transcript:
-            lyrics_lines.append(f"[{entry['start']}s] {entry['text']}")
-        transcript_context = f"\n\nLyrics with Timestamps:\n" + "\n".join(lyrics_lines)
+        transcript_context = "\n\nLyrics with Timestamps:\n" + "\n".join(
+            "[%ds] %s" % (entry['start'], entry['text']) for entry in _compress_transcript(transcript))
     
-    prompt = f"""Generate interesting Pop Up Video style facts for this music video:
-
-"{title}" by {artist}
-YouTube Video ID: {video_id}
-Video Duration: {int(duration) if duration else 'unknown'} seconds{description_context}{transcript_context}
-
-Generate fun, surprising trivia facts about:
-- The song's creation and recording
-- The artist/band members
-- The music video production
-- The song's chart performance and cultural impact
-- The era when this was released
-- Any interesting backstory or context
-- Specific lyrics and their meanings (if transcript provided)
-- Don't just quote lyrics and say it's a double entendre; make it an interesting fact, and you can use wordplay yourself.
-- For the Lyric references, provide a second layer of meaning or interpretation.
-- No Emojis.
-
-IMPORTANT: If lyrics/transcript is provided above:
-- Match facts to relevant timestamps where specific lyrics are sung. THis does not have to be on a 15 second boundary or anything.
-- Don't put the timestamp in the facts themselves, but ensure the timing corresponds to when the lyric is sung.
-- You also don't have to quote the lyrics in the fact, just allude to them. This saves space and allows more room for facts.
-- Reference actual lyrics when discussing song meaning or wordplay
-- Use real references from sites like genius.com, songfacts.com, or similar to provide accurate lyric interpretations
-- Time facts to appear during meaningful or interesting lyrical moments
-- Feel free to include facts about other people mentioned in the lyrics at the appropriate time stamps where they're mentioned in the transcript. 
-- Call out double entendres, puns, or clever wordplay in the lyrics, but not for every fact.
-
-Facts should be:
-- Short (1-2 sentences max, under 200 characters)
-- Entertaining and surprising
-- Factually accurate (DO NOT make up information). cite your sources.
-- In the style of VH1's Pop Up Video
-- Relevant to the song, artist, and lyrics, but also feel free to call out layers or other interesting trivia.
-- Any facts that are boring or dry should be avoided, or modified to be more entertaining.
-- "Punched Up" a notch or two for maximum entertainment value.
+    dynamic = MUSIC_DYNAMIC_TEMPLATE.format_map({
+        'title': title,
+        'artist': artist,
+        'video_id': video_id,
+        'duration': int(duration) if duration else 'unknown',
+        'description_context': description_context,
+        'transcript_context': transcript_context,
+        'timing_instruction': timing_instruction
+    })
+    
+    return MUSIC_STATIC_INSTRUCTIONS, dynamic
 
-{timing_instruction}
 
-Return ONLY valid JSON matching this structure:
-{{
-  "facts": [
-    {{"time": 10, "text": "First fact..."}},
-    {{"time": 25, "text": "Second fact..."}},
-    ...
-  ]
-}}"""
+def generate_facts_with_grok(artist, song, title, video_id, duration=None, description=None, transcript=None):
+    """
+    Call Grok API using xAI SDK with Pydantic validation for music videos.
+    """
+    if not xai_client:
+        # Fallback for testing without API key
+        return [
+            {"time": 10, "text": f"This is {artist} - {song}!"},
+            {"time": 30, "text": "Pop Up Video facts coming soon!"},
+            {"time": 60, "text": "Set your GROK_API_KEY environment variable to generate real facts."}
+        ]
     
-    facts = _call_grok_with_retry(prompt)
-    return {'facts': facts, 'prompt': prompt}
+    instructions, details = _build_music_prompt(artist, song, title, video_id, duration, description, transcript)
+    facts = _call_grok_with_retry(instructions, details)
+    return {'facts': facts, 'prompt': instructions + '\n\n' + details}
 
 
-def _call_grok_with_retry(prompt):
+def _call_grok_with_retry(instructions, details):
 
     """
     Helper function to call Grok with retry logic using Structured Outputs.
+    The byte-stable instruction block goes first so the provider's prefix
+    cache can reuse it; the per-video details follow as a second message.
     """
     max_retries = 3
     
@@ -374,17 +653,17 @@ def _call_grok_with_retry(prompt):
             
             # Use xAI SDK with Structured Outputs - guarantees valid JSON
             chat = xai_client.chat.create(model=GROK_MODEL)
-            chat.append(system("You are a Pop Up Video fact generator. Generate interesting, accurate trivia facts."))
-            chat.append(user(prompt))
+            chat.append(SYSTEM_MESSAGE)
+            chat.append(user(instructions))
+            chat.append(user(details))
             
             # Use chat.parse() with Pydantic model - returns validated object directly
             response, facts_list = chat.parse(FactsList)
             
             print(f"✅ Generated {len(facts_list.facts)} facts successfully")
             
-            # Convert Pydantic objects to dicts
-            facts = [{"time": fact.time, "text": fact.text} for fact in facts_list.facts]
-            return facts
+            # Convert Pydantic objects to dicts via pydantic-core's serializer
+            return facts_list.model_dump()['facts']
             
         except Exception as attempt_error:
             print(f"⚠️  Attempt {attempt + 1} failed: {attempt_error}")
@@ -393,10 +672,11 @@ def _call_grok_with_retry(prompt):
             if attempt == max_retries - 1:
                 raise
             
-            # Otherwise wait a bit and retry
-            print(f"🔄 Retrying in 2 seconds...")
-            import time
-            time.sleep(2)
+            # Otherwise back off with full jitter so a burst of failing
+            # requests doesn't retry in lockstep against a struggling upstream
+            delay = random.uniform(0, min(30, 2 ** (attempt + 1)))
+            print(f"🔄 Retrying in {delay:.1f} seconds...")
+            time.sleep(delay)
     
     # Fallback if all retries failed
     return [
@@ -405,10 +685,125 @@ def _call_grok_with_retry(prompt):
     ]
 
 
+def _stream_grok_facts(instructions, details):
+    """
+    Stream a Grok completion and yield each fact dict as soon as its JSON
+    object closes, instead of waiting for the full response.
+    """
+    chat = xai_client.chat.create(model=GROK_MODEL)
+    chat.append(SYSTEM_MESSAGE)
+    chat.append(user(instructions))
+    chat.append(user(details))
+
+    # Scan the token stream with a brace-depth counter (string/escape aware).
+    # The response is {"facts": [{...}, {...}, ...]}, so each fact object
+    # opens at depth 2 and is complete when depth drops back to 1.
+    depth = 0
+    in_string = False
+    escape = False
+    fact_buf = None
+    for response, chunk in chat.stream():
+        content = chunk.content
+        if not content:
+            continue
+        for ch in content:
+            if fact_buf is not None:
+                fact_buf.append(ch)
+            if in_string:
+                if escape:
+                    escape = False
+                elif ch == '\\':
+                    escape = True
+                elif ch == '"':
+                    in_string = False
+                continue
+            if ch == '"':
+                in_string = True
+            elif ch == '{':
+                depth += 1
+                if depth == 2 and fact_buf is None:
+                    fact_buf = ['{']
+            elif ch == '}':
+                depth -= 1
+                if depth == 1 and fact_buf is not None:
+                    try:
+                        fact = FACT_ADAPTER.validate_json(''.join(fact_buf))
+                    except ValidationError:
+                        fact = None
+                    fact_buf = None
+                    if fact is not None:
+                        yield fact.model_dump()
+
+
+def _stream_facts_response(facts_file, video_id, title, content_type, artist, song, instructions, details, canonical_key, lock):
+    """
+    Return an SSE response that emits each fact as it is generated, then
+    saves the complete facts file like the blocking path does. Known songs
+    (canonical_key hit) replay their cached facts over SSE instead of
+    paying a fresh Grok call, and new results are registered so future
+    re-uploads of the same song reuse them.
+
+    Takes ownership of the per-video single-flight lock: the route acquires
+    it, but the Grok call only happens once the WSGI server iterates this
+    generator, so the lock must be released here rather than before the
+    route returns - otherwise concurrent requests for the same video would
+    slip past the cache re-check and fire duplicate Grok calls.
+    """
+    def generate():
+        facts = []
+        try:
+            reused = _canonical_lookup(canonical_key) if canonical_key else None
+            if reused is not None:
+                print(f"♻️  Reusing facts for {artist} - {song} from video {reused.get('videoId')}")
+                facts = reused['facts']
+                prompt_used = reused.get('prompt', '')
+                for fact in facts:
+                    yield b'data: ' + orjson.dumps(fact) + b'\n\n'
+            else:
+                prompt_used = instructions + '\n\n' + details
+                for fact in _stream_grok_facts(instructions, details):
+                    facts.append(fact)
+                    yield b'data: ' + orjson.dumps(fact) + b'\n\n'
+
+            # Mirror the blocking path's min-1 invariant (FactsList requires
+            # at least one fact, and a failed generation raises there): never
+            # write an empty facts file, since the cache-hit check would then
+            # short-circuit every future request for this video
+            if not facts:
+                raise ValueError("Stream produced no valid facts")
+
+            facts_data = {
+                'videoId': video_id,
+                'title': title,
+                'contentType': content_type,
+                'artist': artist,
+                'song': song,
+                'generatedAt': time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime()),
+                'prompt': prompt_used,
+                'facts': facts
+            }
+            _write_facts_file(facts_file, facts_data)
+
+            # Make these facts reusable by other uploads of the same song
+            if canonical_key:
+                _canonical_register(canonical_key, video_id)
+
+            print(f"Facts saved to: {facts_file}")
+
+            yield b'event: done\ndata: ' + orjson.dumps({'count': len(facts)}) + b'\n\n'
+        except Exception as e:
+            print(f"Error streaming facts: {e}")
+            yield b'event: error\ndata: ' + orjson.dumps({'error': str(e)}) + b'\n\n'
+        finally:
+            _release_video_lock(video_id, lock)
+
+    return app.response_class(generate(), mimetype='text/event-stream')
+
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint."""
-    return jsonify({'status': 'ok', 'service': 'PopUpVideo Facts Generator'})
+    return ojson({'status': 'ok', 'service': 'PopUpVideo Facts Generator'})
 
 
 @app.route('/generate-facts', methods=['POST'])
@@ -423,108 +818,169 @@ def generate_facts():
         title = data.get('title', '')
         duration = data.get('duration', None)  # Optional duration in seconds
         description = data.get('description', None)  # Optional video description
+        stream = bool(data.get('stream', False))  # Opt-in SSE streaming
         
         if not video_id or not title:
-            return jsonify({'error': 'Missing video_id or title'}), 400
+            return ojson({'error': 'Missing video_id or title'}, 400)
+        
+        if not VIDEO_ID_RE.match(video_id):
+            return ojson({'error': 'Invalid video_id'}, 400)
+        
+        if len(title) > MAX_TITLE_LENGTH:
+            return ojson({'error': 'Title too long'}, 400)
         
         print(f"📹 Processing video: {video_id} - {title}")
         
         # Check if facts already exist (do this BEFORE fetching transcript)
-        facts_file = os.path.join(FACTS_DIR, f'{video_id}.json')
-        if os.path.exists(facts_file):
+        facts_file = FACTS_DIR / f'{video_id}.json'
+        try:
+            # One stat covers both the existence check and the LRU key
+            cache_mtime_ns = facts_file.stat().st_mtime_ns
+        except FileNotFoundError:
+            cache_mtime_ns = None
+        if cache_mtime_ns is not None:
             print(f"✅ Using cached facts from: {facts_file}")
-            with open(facts_file, 'r', encoding='utf-8') as f:
-                existing_facts = json.load(f)
-            return jsonify({
-                'source': 'cache',
-                'data': existing_facts
-            })
+            # Splice the file bytes straight into the response envelope -
+            # no need to parse and re-serialize JSON we wrote ourselves.
+            # Repeat hits for a hot video come out of the in-memory LRU.
+            return _cached_facts_response(video_id, cache_mtime_ns)
+        
+        # Single-flight: if another request is already generating facts for
+        # this video, wait for it instead of firing a duplicate Grok call,
+        # then serve its output from the cache re-check below
+        lock = _video_lock(video_id)
+        lock.acquire()
+        lock_owned = True
+        try:
+            try:
+                cache_mtime_ns = facts_file.stat().st_mtime_ns
+            except FileNotFoundError:
+                cache_mtime_ns = None
+            if cache_mtime_ns is not None:
+                print(f"✅ Using facts generated by a concurrent request: {facts_file}")
+                return _cached_facts_response(video_id, cache_mtime_ns)
+
+            # Only fetch transcript if we need to generate new facts; kick it
+            # off in the pool so the network wait overlaps classification
+            transcript_future = _EXECUTOR.submit(fetch_youtube_transcript, video_id)
         
-        # Only fetch transcript if we need to generate new facts
-        transcript = fetch_youtube_transcript(video_id)
+            # Check if this looks like a music video while the fetch runs
+            is_music, reason = is_likely_music_video(title)
+            print(f"🎵 Content type check: {is_music} - {reason}")
         
-        # Log transcript availability
-        if transcript and len(transcript) > 0:
-            print(f"📝 Transcript available: {len(transcript)} entries")
-        else:
-            print("📝 No transcript available")
+            transcript = transcript_future.result()
+        
+            # Log transcript availability
+            if transcript and len(transcript) > 0:
+                print(f"📝 Transcript available: {len(transcript)} entries")
+            else:
+                print("📝 No transcript available")
         
-        # Check if this looks like a music video
-        is_music, reason = is_likely_music_video(title)
-        print(f"🎵 Content type check: {is_music} - {reason}")
+            duration_info = f" ({int(duration)}s)" if duration else ""
+            canonical_key = None
         
-        duration_info = f" ({int(duration)}s)" if duration else ""
+            # Streaming path: emit facts over SSE as soon as each one is
+            # generated instead of buffering the full Grok response
+            if stream and xai_client:
+                parsed = parse_video_title(title) if is_music else None
+                if parsed and not (not parsed.is_music and parsed.artist == 'Unknown'):
+                    content_type, artist, song = 'music', parsed.artist, parsed.song
+                    canonical_key = _canonical_key(artist, song, duration)
+                    instructions, details = _build_music_prompt(artist, song, parsed.full_title, video_id, duration, description, transcript)
+                else:
+                    content_type, artist, song = 'general', ('Unknown' if is_music else 'N/A'), title
+                    instructions, details = _build_general_prompt(title, video_id, duration, description, transcript)
+                print(f"🌊 Streaming {content_type} facts for: {title} (ID: {video_id}){duration_info}")
+                # The SSE generator's finally releases the lock once the
+                # stream (and its facts-file write) actually finishes
+                response = _stream_facts_response(facts_file, video_id, title, content_type, artist, song, instructions, details, canonical_key, lock)
+                lock_owned = False
+                return response
         
-        # Generate facts based on content type
-        if is_music:
-            # Parse video title for music content
-            parsed = parse_video_title(title)
+            # Generate facts based on content type
+            if is_music:
+                # Parse video title for music content
+                parsed = parse_video_title(title)
             
-            # Double-check parsing quality
-            if not parsed['is_music'] and parsed['artist'] == 'Unknown':
-                print(f"⚠️  Unclear music video format, treating as general content: {title}")
-                # Fallback to general facts
-                print(f"Generating general facts for: {title} (ID: {video_id}){duration_info}")
+                # Double-check parsing quality
+                if not parsed.is_music and parsed.artist == 'Unknown':
+                    print(f"⚠️  Unclear music video format, treating as general content: {title}")
+                    # Fallback to general facts
+                    print(f"Generating general facts for: {title} (ID: {video_id}){duration_info}")
+                    result = generate_general_facts_with_grok(title, video_id, duration, description, transcript)
+                    facts = result['facts']
+                    prompt_used = result['prompt']
+                    content_type = 'general'
+                    artist = 'Unknown'
+                    song = title
+                else:
+                    artist = parsed.artist
+                    song = parsed.song
+                    content_type = 'music'
+                    canonical_key = _canonical_key(artist, song, duration)
+                    reused = _canonical_lookup(canonical_key)
+                    if reused is not None:
+                        print(f"♻️  Reusing facts for {artist} - {song} from video {reused.get('videoId')}")
+                        facts = reused['facts']
+                        prompt_used = reused.get('prompt', '')
+                    else:
+                        print(f"Generating music facts for: {artist} - {song} (ID: {video_id}){duration_info}")
+                        result = generate_facts_with_grok(artist, song, parsed.full_title, video_id, duration, description, transcript)
+                        facts = result['facts']
+                        prompt_used = result['prompt']
+            else:
+                # Generate general facts for non-music content
+                print(f"🎬 Generating general facts for: {title} (ID: {video_id}){duration_info}")
                 result = generate_general_facts_with_grok(title, video_id, duration, description, transcript)
                 facts = result['facts']
                 prompt_used = result['prompt']
                 content_type = 'general'
-                artist = 'Unknown'
+                artist = 'N/A'
                 song = title
-            else:
-                print(f"Generating music facts for: {parsed['artist']} - {parsed['song']} (ID: {video_id}){duration_info}")
-                result = generate_facts_with_grok(parsed['artist'], parsed['song'], parsed['full_title'], video_id, duration, description, transcript)
-                facts = result['facts']
-                prompt_used = result['prompt']
-                content_type = 'music'
-                artist = parsed['artist']
-                song = parsed['song']
-        else:
-            # Generate general facts for non-music content
-            print(f"🎬 Generating general facts for: {title} (ID: {video_id}){duration_info}")
-            result = generate_general_facts_with_grok(title, video_id, duration, description, transcript)
-            facts = result['facts']
-            prompt_used = result['prompt']
-            content_type = 'general'
-            artist = 'N/A'
-            song = title
         
-        # Create facts object
-        facts_data = {
-            'videoId': video_id,
-            'title': title,
-            'contentType': content_type,
-            'artist': artist,
-            'song': song,
-            'generatedAt': datetime.utcnow().isoformat() + 'Z',
-            'prompt': prompt_used,
-            'facts': facts
-        }
+            # Create facts object
+            facts_data = {
+                'videoId': video_id,
+                'title': title,
+                'contentType': content_type,
+                'artist': artist,
+                'song': song,
+                'generatedAt': time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime()),
+                'prompt': prompt_used,
+                'facts': facts
+            }
         
-        # Save to file
-        with open(facts_file, 'w', encoding='utf-8') as f:
-            json.dump(facts_data, f, indent=2, ensure_ascii=False)
+            # Save to file
+            _write_facts_file(facts_file, facts_data)
         
-        print(f"Facts saved to: {facts_file}")
+            # Make these facts reusable by other uploads of the same song
+            if canonical_key:
+                _canonical_register(canonical_key, video_id)
         
-        return jsonify({
-            'source': 'generated',
-            'data': facts_data
-        })
+            print(f"Facts saved to: {facts_file}")
         
+            return ojson({
+                'source': 'generated',
+                'data': facts_data
+            })
+        finally:
+            if lock_owned:
+                _release_video_lock(video_id, lock)
+
     except Exception as e:
         print(f"Error in generate_facts: {e}")
-        return jsonify({'error': str(e)}), 500
+        return ojson({'error': str(e)}, 500)
 
 
 @app.route('/list-facts', methods=['GET'])
 def list_facts():
     """List all cached fact files."""
     try:
-        files = [f.replace('.json', '') for f in os.listdir(FACTS_DIR) if f.endswith('.json')]
-        return jsonify({'count': len(files), 'video_ids': files})
+        with _manifest_lock:
+            files = sorted(_MANIFEST)
+        return ojson({'count': len(files), 'video_ids': files})
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return ojson({'error': str(e)}, 500)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,16 @@
+"""
+Production entrypoint for the facts backend.
+
+gevent's monkey-patching must happen before anything else imports the
+socket/ssl modules, so this module does it first and only then imports the
+Flask app. Run with:
+
+    gunicorn -k gevent -w 1 --worker-connections 1000 -b 0.0.0.0:5000 wsgi:app
+
+Each Grok call is multi-second network wait, so a single gevent worker can
+service many concurrent /generate-facts requests instead of one at a time.
+"""
+from gevent import monkey
+monkey.patch_all()
+
+from app import app  # noqa: E402